@@ -1,4 +1,6 @@
 import os
+import io
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import cv2
@@ -7,23 +9,51 @@ from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Image, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
+from evidence_pack import EvidencePack, is_pack_ref
 
 class ChallanGenerator:
     """
     Class to generate challans (tickets) for speeding violations
     """
-    def __init__(self, csv_file, output_dir='reports'):
+    def __init__(self, csv_file, output_dir='reports', evidence_dir='evidence'):
         """
         Initialize the challan generator
         
         Args:
             csv_file (str): Path to CSV file with speed data
             output_dir (str): Directory to save generated challans
+            evidence_dir (str): Evidence pack referenced by "pack:" snapshot paths
         """
         self.csv_file = csv_file
         self.output_dir = output_dir
+        self.evidence_dir = evidence_dir
+        self.evidence_pack = None
         os.makedirs(output_dir, exist_ok=True)
         
+    def load_snapshot(self, snapshot_path):
+        """
+        Load a violation snapshot from an evidence pack or a plain image file
+        
+        Args:
+            snapshot_path (str): "pack:<digest>" reference or file path
+            
+        Returns:
+            numpy.ndarray or None: Decoded image
+        """
+        if not is_pack_ref(snapshot_path):
+            if not os.path.exists(snapshot_path):
+                return None
+            return cv2.imread(snapshot_path)
+        
+        if self.evidence_pack is None:
+            self.evidence_pack = EvidencePack(self.evidence_dir, readonly=True)
+        view = self.evidence_pack.get(snapshot_path)
+        if view is None:
+            return None
+        # Decode straight from the memory-mapped segment
+        with view:
+            return cv2.imdecode(np.frombuffer(view, dtype=np.uint8), cv2.IMREAD_COLOR)
+        
     def load_violations(self, min_speed=None):
         """
         Load violations from CSV file
@@ -86,26 +116,20 @@ class ChallanGenerator:
             elements.append(Spacer(1, 20))
             
             # Add image if available
-            if os.path.exists(snapshot_path):
+            img = self.load_snapshot(snapshot_path)
+            if img is not None:
                 # Resize image for PDF
-                img = cv2.imread(snapshot_path)
-                if img is not None:
-                    height, width = img.shape[:2]
-                    max_width = 400
-                    if width > max_width:
-                        ratio = max_width / width
-                        img = cv2.resize(img, (max_width, int(height * ratio)))
-                    
-                    # Save resized image
-                    temp_img_path = os.path.join(self.output_dir, f"temp_{vehicle_id}.jpg")
-                    cv2.imwrite(temp_img_path, img)
-                    
-                    # Add to PDF
+                height, width = img.shape[:2]
+                max_width = 400
+                if width > max_width:
+                    ratio = max_width / width
+                    img = cv2.resize(img, (max_width, int(height * ratio)))
+                
+                # Hand the resized image to reportlab in memory
+                ok, buffer = cv2.imencode(".jpg", img)
+                if ok:
                     elements.append(Paragraph("Vehicle Image:", normal_style))
-                    elements.append(Image(temp_img_path, width=350, height=200))
-                    
-                    # Clean up temp file
-                    os.remove(temp_img_path)
+                    elements.append(Image(io.BytesIO(buffer.tobytes()), width=350, height=200))
             
             # Build PDF
             doc.build(elements)
@@ -212,4 +236,8 @@ class ChallanGenerator:
             ('GRID', (0, 0), (-1, -1), 1, colors.black)
         ]))
         
-        elements.
\ No newline at end of file
+        elements.append(table)
+        
+        # Build PDF
+        doc.build(elements)
+        return output_path
@@ -0,0 +1,56 @@
+import os
+import gzip
+import json
+
+CHECKPOINT_VERSION = 1
+
+def save_checkpoint(path, state):
+    """
+    Atomically write a compressed JSON checkpoint
+
+    Args:
+        path (str): Checkpoint file
+        state (dict): JSON-serializable run state
+    """
+    state = dict(state, version=CHECKPOINT_VERSION)
+    temp_path = path + ".tmp"
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        json.dump(state, f, separators=(",", ":"))
+    # A crash during the write leaves the previous checkpoint intact
+    os.replace(temp_path, path)
+
+def load_checkpoint(path):
+    """
+    Read a checkpoint written by save_checkpoint
+
+    Args:
+        path (str): Checkpoint file
+
+    Returns:
+        dict or None: Run state, None if there is no usable checkpoint
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable checkpoint {path}: {e}")
+        return None
+    if state.get("version") != CHECKPOINT_VERSION:
+        print(f"⚠️ Ignoring checkpoint {path} with unsupported version {state.get('version')}")
+        return None
+    return state
+
+def truncate_file(path, size):
+    """
+    Cut an append-only output back to its size at checkpoint time
+
+    Args:
+        path (str): Output file
+        size (int): Size recorded in the checkpoint
+    """
+    if size is None or not os.path.exists(path):
+        return
+    with open(path, 'r+b') as f:
+        f.truncate(size)
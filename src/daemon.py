@@ -0,0 +1,520 @@
+import os
+import csv
+import json
+import time
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+
+from vehicle_tracking import VehicleTracker
+from speed_calculation import SpeedCalculator
+from track_events import TrackEventStream, CallbackSink
+from evidence import EvidenceRecorder
+from evidence_pack import EvidencePack
+from motion_gate import MotionGate
+from frame_source import open_frame_source, FFmpegFrameSource
+from test_logging import setup_logger
+
+class LRUCache:
+    """
+    Small thread-safe least-recently-used cache
+    """
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity (int): Maximum number of entries
+        """
+        self.capacity = capacity
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.capacity:
+                self.items.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def recent(self, limit=None):
+        """Most recently used values first"""
+        with self.lock:
+            values = list(reversed(self.items.values()))
+        return values[:limit] if limit else values
+
+class StreamWorker(threading.Thread):
+    """
+    Runs the detection pipeline for one attached stream
+    """
+    def __init__(self, stream_id, source_path, daemon, decoder="opencv", frame_step=1, width=None, gate_config=None):
+        """
+        Args:
+            stream_id (str): Name used in the API
+            source_path (str): Video file or stream URL
+            daemon (TrafficDaemon): Owner holding the shared detector, evidence pack and caches
+            decoder (str): "opencv" or "ffmpeg"
+            frame_step (int): Process every n-th frame
+            width (int, optional): Inference width for the FFmpeg decoder
+            gate_config (dict, optional): MotionGate.from_config options, ROI in source pixels
+        """
+        super().__init__(name=f"stream-{stream_id}", daemon=True)
+        self.stream_id = stream_id
+        self.source_path = source_path
+        self.owner = daemon
+        self.decoder = decoder
+        self.frame_step = frame_step
+        self.width = width
+        self.gate_config = gate_config
+        self.stop_event = threading.Event()
+        self.csv_file = os.path.join(daemon.log_dir, f"{stream_id}_speed_data.csv")
+        self.csv_lock = threading.Lock()
+
+        # Published for API readers; replaced wholesale so reads need no lock
+        self.active_tracks = {}
+        self.pending = {}  # Violation ID -> violation waiting for its evidence
+        self.state = "starting"
+        self.error = None
+        self.frames = 0
+        self.vehicles = 0
+        self.violations = 0
+        self.started_at = time.time()
+        self.motion_gate = None
+
+    def stats(self):
+        """Per-stream counters for the API"""
+        elapsed = time.time() - self.started_at
+        stats = {
+            "stream_id": self.stream_id,
+            "source": self.source_path,
+            "state": self.state,
+            "error": self.error,
+            "frames": self.frames,
+            "fps": self.frames / elapsed if elapsed > 0 else 0.0,
+            "active_tracks": len(self.active_tracks),
+            "vehicles": self.vehicles,
+            "violations": self.violations
+        }
+        if self.motion_gate is not None:
+            stats["motion_gate"] = self.motion_gate.stats()
+        return stats
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        try:
+            self.process()
+            self.state = "stopped" if self.stop_event.is_set() else "finished"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            self.owner.logger.error(f"Stream {self.stream_id} failed: {e}")
+
+    def process(self):
+        owner = self.owner
+        source = open_frame_source(self.source_path, backend=self.decoder, width=self.width,
+                                   frame_step=self.frame_step, buffer_count=owner.evidence_frames + 2)
+        speed_calculator = SpeedCalculator(owner.speed_factor * source.pixel_scale)
+        # Finalizing a track pops its speed history, keeping memory flat for a resident process
+        event_stream = TrackEventStream(CallbackSink(self.on_event), update_interval=0,
+                                        summary_provider=speed_calculator.pop_summary)
+        tracker = VehicleTracker(event_stream=event_stream)
+        self.motion_gate = MotionGate.from_config(self.gate_config, pixel_scale=source.pixel_scale)
+        evidence = EvidenceRecorder(owner.evidence_pack, buffer_size=owner.evidence_frames,
+                                    copy_crops=isinstance(source, FFmpegFrameSource), logger=owner.logger)
+
+        if not os.path.exists(self.csv_file):
+            with open(self.csv_file, 'w') as f:
+                f.write("timestamp,vehicle_id,speed,snapshot_path\n")
+
+        self.state = "running"
+        self.started_at = time.time()
+        try:
+            while not self.stop_event.is_set():
+                ret, frame, frame_time = source.read()
+                if not ret:
+                    break
+                self.frames += 1
+
+                if self.motion_gate.should_detect(frame, bool(tracker.tracks)):
+                    # The model is shared by every stream
+                    with owner.detector_lock:
+                        detections = owner.detector.detect(frame)
+                else:
+                    detections = []
+
+                tracked_vehicles = tracker.update(detections, frame_time)
+                speeds = speed_calculator.calculate_speeds(tracked_vehicles, source.fps)
+                evidence.push_frame(frame, tracked_vehicles)
+
+                self.active_tracks = {
+                    vehicle_id: {
+                        "bbox": list(track['bbox']),
+                        "class_id": track['class_id'],
+                        "speed": float(speeds[vehicle_id]["speed"]) if vehicle_id in speeds else None,
+                        "timestamp": frame_time
+                    }
+                    for vehicle_id, track in tracked_vehicles.items()
+                }
+
+                for vehicle_id, vehicle_data in speeds.items():
+                    speed = float(vehicle_data["speed"])
+                    if speed <= owner.speed_limit:
+                        continue
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    violation_id = f"{self.stream_id}-{vehicle_id}-{timestamp}"
+                    # One violation per vehicle per second, like the snapshot naming in main.py
+                    if violation_id in owner.violations or violation_id in self.pending:
+                        continue
+                    violation = {
+                        "id": violation_id,
+                        "stream_id": self.stream_id,
+                        "vehicle_id": vehicle_id,
+                        "timestamp": timestamp,
+                        "speed": round(speed, 1),
+                        "snapshot_path": None
+                    }
+                    # Listed only once stored, so the API never serves a violation without evidence
+                    self.pending[violation_id] = violation
+                    if evidence.submit(vehicle_id, on_done=self.record(violation)) is None:
+                        del self.pending[violation_id]
+        finally:
+            source.release()
+            evidence.close()
+            self.active_tracks = {}
+
+    def on_event(self, event):
+        """Count vehicles whose tracks have ended"""
+        if event["event"] == "finalized":
+            self.vehicles += 1
+
+    def record(self, violation):
+        """Build the callback that stores a violation once its evidence is encoded"""
+        def write_row(snapshot_path):
+            if snapshot_path is not None:
+                violation["snapshot_path"] = snapshot_path
+                with self.csv_lock, open(self.csv_file, 'a') as f:
+                    f.write(f"{violation['timestamp']},{violation['vehicle_id']},"
+                            f"{violation['speed']:.1f},{snapshot_path}\n")
+                self.owner.violations.put(violation["id"], violation)
+                self.violations += 1
+            # A failed encode was already logged by the recorder and is dropped
+            self.pending.pop(violation["id"], None)
+        return write_row
+
+class TrafficDaemon:
+    """
+    Keeps the model loaded, runs attached streams and answers queries over HTTP
+    """
+    def __init__(self, model_path, log_dir="logs", evidence_dir="evidence", report_dir="reports",
+                 speed_limit=50, speed_factor=0.1, violation_cache=1024, pdf_cache=32, gate_config=None):
+        """
+        Args:
+            model_path (str): Path to the YOLOv8 weights, loaded once for all streams
+            log_dir (str): Directory for per-stream CSVs and the daemon log
+            evidence_dir (str): Evidence pack shared by all streams
+            report_dir (str): Directory for rendered challans
+            speed_limit (float): Speed limit in km/h
+            speed_factor (float): Calibration factor passed to SpeedCalculator
+            violation_cache (int): Recent violations kept in memory
+            pdf_cache (int): Rendered challan PDFs kept in memory
+            gate_config (dict, optional): Default MotionGate.from_config options for attached streams
+        """
+        from vehicle_detection import VehicleDetector
+
+        os.makedirs(log_dir, exist_ok=True)
+        self.log_dir = log_dir
+        self.report_dir = report_dir
+        self.evidence_dir = evidence_dir
+        self.speed_limit = speed_limit
+        self.speed_factor = speed_factor
+        self.gate_config = gate_config
+        self.evidence_frames = 8
+        self.logger = setup_logger("daemon_logger", os.path.join(log_dir, "daemon.log"))
+
+        self.detector = VehicleDetector(model_path)
+        self.detector_lock = threading.Lock()
+        self.evidence_pack = EvidencePack(evidence_dir)
+        self.streams = {}
+        self.violations = LRUCache(violation_cache)
+        self.pdfs = LRUCache(pdf_cache)
+        self.challan_generators = {}  # Stream ID -> ChallanGenerator writing to its own directory
+        self.render_lock = threading.Lock()
+
+    def attach(self, stream_id, source, decoder="opencv", frame_step=1, width=None, gate_config=None):
+        """Start processing a stream, gate_config overrides the daemon's motion gate settings"""
+        if not isinstance(stream_id, str) or not stream_id or "-" in stream_id or "/" in stream_id:
+            raise ValueError(f"Stream ID must be a non-empty string without '-' or '/': {stream_id!r}")
+        if not isinstance(source, str) or not source:
+            raise ValueError(f"Stream source must be a non-empty string: {source!r}")
+        if decoder not in ("opencv", "ffmpeg"):
+            raise ValueError(f"Unknown decoder: {decoder!r}")
+        if not isinstance(frame_step, int) or frame_step < 1:
+            raise ValueError(f"frame_step must be a positive integer: {frame_step!r}")
+        if width is not None and (not isinstance(width, int) or width < 2):
+            raise ValueError(f"width must be an integer of at least 2: {width!r}")
+        if gate_config is None:
+            gate_config = self.gate_config
+        if gate_config is not None and not isinstance(gate_config, dict):
+            raise ValueError(f"Motion gate settings must be an object: {gate_config!r}")
+        # Reject bad settings here rather than in the worker thread
+        MotionGate.from_config(gate_config)
+        current = self.streams.get(stream_id)
+        if current is not None and current.is_alive():
+            raise ValueError(f"Stream {stream_id} is already attached")
+        worker = StreamWorker(stream_id, source, self, decoder=decoder, frame_step=frame_step, width=width,
+                              gate_config=gate_config)
+        self.streams[stream_id] = worker
+        worker.start()
+        self.logger.info(f"Attached stream {stream_id}: {source}")
+        return worker
+
+    def detach(self, stream_id):
+        """Stop a stream and forget it"""
+        worker = self.streams.pop(stream_id)
+        worker.stop()
+        worker.join()
+        self.logger.info(f"Detached stream {stream_id}")
+
+    def is_pending(self, violation_id):
+        """Whether a violation was detected but its evidence is not stored yet"""
+        worker = self.streams.get(violation_id.partition("-")[0])
+        return worker is not None and violation_id in worker.pending
+
+    def find_violation(self, violation_id):
+        """
+        Look up a violation in the cache, falling back to the stream's CSV
+
+        Args:
+            violation_id (str): "<stream>-<vehicle>-<timestamp>" identifier
+
+        Returns:
+            dict or None: Violation record
+        """
+        violation = self.violations.get(violation_id)
+        if violation is not None:
+            return violation
+
+        stream_id, _, rest = violation_id.partition("-")
+        vehicle_id, _, timestamp = rest.partition("-")
+        csv_file = os.path.join(self.log_dir, f"{stream_id}_speed_data.csv")
+        if not stream_id or not os.path.exists(csv_file):
+            return None
+        with open(csv_file, 'r', newline='') as f:
+            for row in csv.DictReader(f):
+                if row['vehicle_id'] == vehicle_id and row['timestamp'] == timestamp:
+                    violation = {
+                        "id": violation_id,
+                        "stream_id": stream_id,
+                        "vehicle_id": int(vehicle_id),
+                        "timestamp": timestamp,
+                        "speed": float(row['speed']),
+                        "snapshot_path": row['snapshot_path']
+                    }
+                    self.violations.put(violation_id, violation)
+                    return violation
+        return None
+
+    def render_challan(self, violation, fine_base=100, fine_per_unit=10):
+        """
+        Render (or fetch from cache) the challan PDF for a stored violation
+
+        Returns:
+            bytes or None: PDF content
+        """
+        if not violation["snapshot_path"]:
+            return None
+        pdf = self.pdfs.get(violation["id"])
+        if pdf is not None:
+            return pdf
+
+        with self.render_lock:
+            generator = self.challan_generators.get(violation["stream_id"])
+            if generator is None:
+                from challan import ChallanGenerator
+                # Track IDs repeat across streams, separate directories keep the file names unique
+                generator = ChallanGenerator(None, output_dir=os.path.join(self.report_dir, violation["stream_id"]),
+                                             evidence_dir=self.evidence_dir)
+                self.challan_generators[violation["stream_id"]] = generator
+            fine = fine_base + (violation["speed"] - self.speed_limit) * fine_per_unit
+            path = generator.generate_challan(
+                vehicle_id=violation["vehicle_id"],
+                timestamp=violation["timestamp"],
+                speed=violation["speed"],
+                snapshot_path=violation["snapshot_path"],
+                fine_amount=fine
+            )
+            if path is None:
+                return None
+            # Read before releasing the lock, a later render may rewrite the same file
+            with open(path, 'rb') as f:
+                pdf = f.read()
+        self.pdfs.put(violation["id"], pdf)
+        return pdf
+
+    async def handle(self, method, path, query, body):
+        """
+        Route one API request
+
+        Returns:
+            tuple: (status, payload), payload is JSON-serializable or PDF bytes
+        """
+        parts = [p for p in path.split("/") if p]
+
+        if parts == ["streams"] and method == "GET":
+            # detach may remove streams from an executor thread meanwhile
+            return 200, {"streams": [w.stats() for w in list(self.streams.values())]}
+        if parts == ["streams"] and method == "POST":
+            try:
+                request = json.loads(body or b"{}")
+            except ValueError as e:
+                return 400, {"error": f"Invalid JSON: {e}"}
+            if not isinstance(request, dict):
+                return 400, {"error": "Expected a JSON object"}
+            try:
+                self.attach(request["id"], request["source"], decoder=request.get("decoder", "opencv"),
+                            frame_step=request.get("frame_step", 1), width=request.get("width"),
+                            gate_config=request.get("motion_gate"))
+            except KeyError as e:
+                return 400, {"error": f"Missing field {e}"}
+            except (ValueError, TypeError) as e:
+                return 400, {"error": str(e)}
+            return 201, self.streams[request["id"]].stats()
+        if len(parts) >= 2 and parts[0] == "streams":
+            worker = self.streams.get(parts[1])
+            if worker is None:
+                return 404, {"error": f"Unknown stream {parts[1]}"}
+            if len(parts) == 2 and method == "DELETE":
+                await asyncio.get_running_loop().run_in_executor(None, self.detach, parts[1])
+                return 200, {"detached": parts[1]}
+            if len(parts) == 2 and method == "GET":
+                return 200, worker.stats()
+            if parts[2:] == ["tracks"] and method == "GET":
+                return 200, {"stream_id": worker.stream_id, "tracks": worker.active_tracks}
+
+        if parts == ["stats"] and method == "GET":
+            return 200, {w.stream_id: w.stats() for w in list(self.streams.values())}
+
+        if parts == ["violations"] and method == "GET":
+            try:
+                limit = int(query.get("limit", ["50"])[0])
+            except ValueError:
+                limit = -1
+            if limit < 0:
+                return 400, {"error": f"limit must be a non-negative integer: {query['limit'][0]!r}"}
+            stream_id = query.get("stream", [None])[0]
+            recent = [v for v in self.violations.recent() if stream_id in (None, v["stream_id"])]
+            return 200, {"violations": recent[:limit]}
+        if len(parts) >= 2 and parts[0] == "violations" and method == "GET":
+            # Stored violations leave the pending set only after they are listed
+            if self.is_pending(parts[1]):
+                return 409, {"error": f"Evidence for violation {parts[1]} is still being stored"}
+            loop = asyncio.get_running_loop()
+            violation = await loop.run_in_executor(None, self.find_violation, parts[1])
+            if violation is None:
+                return 404, {"error": f"Unknown violation {parts[1]}"}
+            if len(parts) == 2:
+                return 200, violation
+            if parts[2:] == ["challan"]:
+                pdf = await loop.run_in_executor(None, self.render_challan, violation)
+                if pdf is None:
+                    return 500, {"error": "Could not render challan"}
+                return 200, pdf
+
+        return 404, {"error": f"No route for {method} {path}"}
+
+    async def serve_client(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, target, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length", 0))
+            body = await reader.readexactly(length) if length else b""
+
+            url = urlsplit(target)
+            try:
+                status, payload = await self.handle(method.upper(), url.path, parse_qs(url.query), body)
+            except Exception as e:
+                self.logger.error(f"Error handling {request_line}: {e}")
+                status, payload = 500, {"error": str(e)}
+
+            if isinstance(payload, bytes):
+                content_type, data = "application/pdf", payload
+            else:
+                content_type, data = "application/json", json.dumps(payload).encode("utf-8")
+            reason = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+                      409: "Conflict"}.get(status, "Error")
+            writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                         f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data)
+            await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self.serve_client, host, port)
+        print(f"🛰️ Traffic daemon listening on http://{host}:{port}")
+        self.logger.info(f"Listening on {host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+    def shutdown(self):
+        for stream_id in list(self.streams.keys()):
+            self.detach(stream_id)
+        self.evidence_pack.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the traffic pipeline as a resident daemon")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model", default=os.path.join("models", "yolov8n.pt"))
+    parser.add_argument("--speed-limit", type=float, default=50)
+    parser.add_argument("--stream", action="append", default=[], metavar="ID=SOURCE",
+                        help="Stream to attach at startup, may be repeated")
+    parser.add_argument("--motion-config", default=None,
+                        help="YAML with motion gate options (roi, pixel_threshold, ...) used by every stream")
+    args = parser.parse_args()
+
+    gate_config = None
+    if args.motion_config:
+        import yaml
+        with open(args.motion_config, 'r') as f:
+            gate_config = yaml.safe_load(f) or {}
+
+    print(f"🔍 Loading vehicle detector model from: {args.model}")
+    daemon = TrafficDaemon(args.model, speed_limit=args.speed_limit, gate_config=gate_config)
+    for spec in args.stream:
+        stream_id, _, source = spec.partition("=")
+        daemon.attach(stream_id, source)
+
+    try:
+        asyncio.run(daemon.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+
+class EvidenceRecorder:
+    """
+    Keeps recent clean frames and encodes violation crops in the background
+    """
+    def __init__(self, store, buffer_size=8, workers=2, selection="largest", jpeg_quality=90, copy_crops=False,
+                 logger=None):
+        """
+        Initialize the evidence recorder
+
+        Args:
+            store: Evidence store with a put(bytes) -> str method
+            buffer_size (int): Number of recent frames kept for best-frame selection
+            workers (int): Number of encoder threads
+            selection (str): "largest" bounding box or "sharpest" crop
+            jpeg_quality (int): JPEG quality used when encoding crops
+            copy_crops (bool): Copy crops before queueing them, needed when the frame
+                source reuses its buffers
+            logger (logging.Logger, optional): Receives encode and store failures
+        """
+        if selection not in ("largest", "sharpest"):
+            raise ValueError(f"Unknown evidence selection mode: {selection}")
+
+        self.store = store
+        self.selection = selection
+        self.encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), int(jpeg_quality)]
+        self.copy_crops = copy_crops
+        self.logger = logger
+        # Frames are held by reference; callers must not draw on them afterwards
+        self.frames = deque(maxlen=buffer_size)
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="evidence")
+        self.submitted = OrderedDict()  # Recent violation keys -> futures
+        self.max_submitted = 1024
+
+    def push_frame(self, frame, tracked_vehicles):
+        """
+        Remember a clean frame and the boxes of the vehicles visible in it
+
+        Args:
+            frame (numpy.ndarray): Un-annotated frame
+            tracked_vehicles (dict): Tracks returned by VehicleTracker.update
+        """
+        boxes = {vehicle_id: tuple(data['bbox']) for vehicle_id, data in tracked_vehicles.items()}
+        self.frames.append((frame, boxes))
+
+    def crop(self, frame, bbox):
+        """Return a view of the frame inside the bounding box"""
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = bbox
+        return frame[max(0, y1):min(height, y2), max(0, x1):min(width, x2)]
+
+    def sharpness(self, image):
+        """Variance of the Laplacian, higher means sharper"""
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        return cv2.Laplacian(gray, cv2.CV_64F).var()
+
+    def candidates(self, vehicle_id):
+        """
+        Collect crops of a vehicle from the buffered frames
+
+        Args:
+            vehicle_id (int): Track ID
+
+        Returns:
+            list: (area, crop) tuples, crops are views into buffered frames
+        """
+        crops = []
+        for frame, boxes in self.frames:
+            bbox = boxes.get(vehicle_id)
+            if bbox is None:
+                continue
+            crop = self.crop(frame, bbox)
+            if crop.size > 0:
+                if self.copy_crops:
+                    crop = crop.copy()
+                crops.append((crop.shape[0] * crop.shape[1], crop))
+        return crops
+
+    def submit(self, vehicle_id, key=None, on_done=None):
+        """
+        Queue evidence encoding for a violating vehicle
+
+        Args:
+            vehicle_id (int): Track ID
+            key (hashable, optional): Violations sharing a key reuse one encoded image
+            on_done (callable, optional): Called with the stored path once encoded, or None
+                if encoding or storing failed
+
+        Returns:
+            concurrent.futures.Future or None: Future resolving to the stored path
+        """
+        future = self.submitted.get(key) if key is not None else None
+        if future is None:
+            crops = self.candidates(vehicle_id)
+            if not crops:
+                return None
+            future = self.pool.submit(self._encode, crops)
+            if key is not None:
+                self.submitted[key] = future
+                if len(self.submitted) > self.max_submitted:
+                    self.submitted.popitem(last=False)
+
+        if on_done is not None:
+            future.add_done_callback(lambda f: self._notify(f, vehicle_id, on_done))
+        return future
+
+    def _notify(self, future, vehicle_id, on_done):
+        """Pass the stored path to on_done, reporting why it is missing on failure"""
+        error = future.exception()
+        if error is not None:
+            message = f"Could not store evidence for vehicle {vehicle_id}: {error!r}"
+            if self.logger is not None:
+                self.logger.error(message)
+            else:
+                print(f"❌ {message}")
+            on_done(None)
+        else:
+            on_done(future.result())
+
+    def _encode(self, crops):
+        """Select the best crop, encode it and hand it to the store"""
+        if self.selection == "sharpest":
+            best = max(crops, key=lambda item: self.sharpness(item[1]))[1]
+        else:
+            best = max(crops, key=lambda item: item[0])[1]
+
+        ok, buffer = cv2.imencode(".jpg", best, self.encode_params)
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+        return self.store.put(buffer.tobytes())
+
+    def flush(self):
+        """Wait until every queued encode and its on_done callback has finished"""
+        # Shutting down joins the workers, which also run the done callbacks
+        self.pool.shutdown(wait=True)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="evidence")
+
+    def close(self):
+        """Wait for pending encodes and stop the worker pool"""
+        self.pool.shutdown(wait=True)
+        self.frames.clear()
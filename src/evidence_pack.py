@@ -0,0 +1,437 @@
+import os
+import csv
+import mmap
+import struct
+import glob
+import hashlib
+import argparse
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows, where packs are only used by a single process
+    fcntl = None
+
+# Every record is a small header followed by the encoded image
+RECORD_HEADER = struct.Struct("<4sI20s")  # magic, data length, sha1 digest
+RECORD_MAGIC = b"EVP1"
+REF_PREFIX = "pack:"
+INDEX_FILE = "index.txt"
+LOCK_FILE = "pack.lock"
+
+def is_pack_ref(path):
+    """Check whether a snapshot path refers to an evidence pack record"""
+    return isinstance(path, str) and path.startswith(REF_PREFIX)
+
+class EvidencePack:
+    """
+    Append-only evidence archive made of segment files plus an offset index
+    """
+    def __init__(self, root_dir, max_segment_bytes=256 * 1024 * 1024, readonly=False):
+        """
+        Open (or create) an evidence pack
+
+        Args:
+            root_dir (str): Directory holding the segments and the index
+            max_segment_bytes (int): Size after which a new segment is started
+            readonly (bool): Open for lookups only, e.g. from ChallanGenerator
+        """
+        self.root_dir = root_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.readonly = readonly
+        self.index_path = os.path.join(root_dir, INDEX_FILE)
+        self.lock_path = os.path.join(root_dir, LOCK_FILE)
+        self.lock_file = None
+        self.index = {}  # digest -> (segment, offset, length)
+        self.index_pos = 0
+        self.index_inode = None
+        self.maps = {}  # segment -> mmap
+        self.lock = threading.Lock()
+        self.active_segment = None
+        self.active_file = None
+
+        if not readonly:
+            os.makedirs(root_dir, exist_ok=True)
+            self.lock_file = open(self.lock_path, 'a')
+        with self.file_lock(exclusive=False):
+            self.refresh_index()
+
+        if not readonly:
+            # Writers always append to the highest segment, compaction leaves it alone
+            segments = self.segments()
+            self.active_segment = segments[-1] if segments else 1
+            self.active_file = open(self.segment_path(self.active_segment), 'ab')
+
+    @contextmanager
+    def file_lock(self, exclusive=True):
+        """
+        Hold the advisory lock shared by every process using the pack
+
+        Writers take it exclusively for each append and compaction for its whole run,
+        readers take it shared so they never see a half-replaced index.
+        """
+        if self.lock_file is None and fcntl is not None and os.path.exists(self.lock_path):
+            self.lock_file = open(self.lock_path, 'r')
+        if self.lock_file is None or fcntl is None:
+            yield
+            return
+        fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file.fileno(), fcntl.LOCK_UN)
+
+    def segment_path(self, segment):
+        """Path of a segment file"""
+        return os.path.join(self.root_dir, f"segment_{segment:06d}.pack")
+
+    def segments(self):
+        """List segment numbers present on disk in ascending order"""
+        if not os.path.isdir(self.root_dir):
+            return []
+        numbers = []
+        for name in os.listdir(self.root_dir):
+            if name.startswith("segment_") and name.endswith(".pack"):
+                numbers.append(int(name[len("segment_"):-len(".pack")]))
+        return sorted(numbers)
+
+    def _index_replaced(self, stat):
+        """Whether compact or rollback rewrote the index since it was last read"""
+        return stat.st_ino != self.index_inode or stat.st_size < self.index_pos
+
+    def refresh_index(self):
+        """Load index lines appended since the last refresh, reloading a rewritten index"""
+        try:
+            stat = os.stat(self.index_path)
+        except FileNotFoundError:
+            return
+        if self._index_replaced(stat):
+            # Offsets and segments may all have changed, start over
+            self.index = {}
+            self.index_pos = 0
+            self.index_inode = stat.st_ino
+            self.maps = {}
+        elif stat.st_size == self.index_pos:
+            return
+        with open(self.index_path, 'r') as f:
+            f.seek(self.index_pos)
+            while True:
+                line = f.readline()
+                # Stop at a partially written last line, it is picked up next time
+                if not line.endswith("\n"):
+                    break
+                self.index_pos = f.tell()
+                digest, segment, offset, length = line.split()
+                self.index[digest] = (int(segment), int(offset), int(length))
+
+    def put(self, data):
+        """
+        Append encoded image bytes to the pack
+
+        Args:
+            data (bytes): Encoded image
+
+        Returns:
+            str: Reference to store in the snapshot_path column
+        """
+        if self.readonly:
+            raise RuntimeError("Evidence pack is opened read-only")
+
+        digest = hashlib.sha1(data)
+        key = digest.hexdigest()
+        with self.lock, self.file_lock():
+            # Pick up a compaction done by another process since the last append
+            self.refresh_index()
+            if key in self.index:
+                return REF_PREFIX + key
+
+            if self.active_file.tell() > 0 and self.active_file.tell() + len(data) > self.max_segment_bytes:
+                self.active_file.close()
+                self.active_segment += 1
+                self.active_file = open(self.segment_path(self.active_segment), 'ab')
+
+            header_offset = self.active_file.tell()
+            self.active_file.write(RECORD_HEADER.pack(RECORD_MAGIC, len(data), digest.digest()))
+            self.active_file.write(data)
+            self.active_file.flush()
+
+            offset = header_offset + RECORD_HEADER.size
+            with open(self.index_path, 'a') as f:
+                f.write(f"{key} {self.active_segment} {offset} {len(data)}\n")
+            self.index[key] = (self.active_segment, offset, len(data))
+        return REF_PREFIX + key
+
+    def _map(self, segment, end):
+        """Return a memory map of a segment covering at least `end` bytes"""
+        mapped = self.maps.get(segment)
+        if mapped is not None and len(mapped) >= end:
+            return mapped
+        # The segment grew; older maps are released once no views point into them
+        with open(self.segment_path(segment), 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps[segment] = mapped
+        return mapped
+
+    def get(self, ref):
+        """
+        Look up a record without copying it out of the segment
+
+        Release the returned view when done so the segment can be unmapped.
+
+        Args:
+            ref (str): Reference returned by put, with or without the "pack:" prefix
+
+        Returns:
+            memoryview or None: Encoded image bytes
+        """
+        key = ref[len(REF_PREFIX):] if is_pack_ref(ref) else ref
+        with self.lock, self.file_lock(exclusive=False):
+            # Any reader can outlive a compaction done by another process
+            self.refresh_index()
+            location = self.index.get(key)
+            if location is None:
+                return None
+            segment, offset, length = location
+            if self.active_file is not None and segment == self.active_segment:
+                self.active_file.flush()
+            mapped = self._map(segment, offset + length)
+            return memoryview(mapped)[offset:offset + length]
+
+    def tell(self):
+        """
+        Current end of the pack, used for checkpoints
+
+        Returns:
+            dict: Active segment, its size, the index size and the index inode
+        """
+        with self.lock:
+            self.active_file.flush()
+            stat = os.stat(self.index_path) if os.path.exists(self.index_path) else None
+            return {
+                "segment": self.active_segment,
+                "offset": self.active_file.tell(),
+                "index_offset": stat.st_size if stat is not None else 0,
+                # compact replaces the index file, so a new inode means the offsets are stale
+                "index_inode": stat.st_ino if stat is not None else None
+            }
+
+    def rollback(self, position):
+        """
+        Discard everything appended after a position returned by tell
+
+        Nothing is discarded if the pack was compacted or cut short since the position was
+        taken; records written after it then stay in the pack until the next compaction.
+
+        Args:
+            position (dict): Pack position from a checkpoint
+
+        Returns:
+            bool: True if the pack was rolled back, False if it was left as it is
+        """
+        if self.readonly:
+            raise RuntimeError("Evidence pack is opened read-only")
+
+        with self.lock, self.file_lock():
+            segment_path = self.segment_path(position["segment"])
+            index_stat = os.stat(self.index_path) if os.path.exists(self.index_path) else None
+            compacted = (position.get("index_inode") is not None
+                         and (index_stat is None or index_stat.st_ino != position["index_inode"]))
+            # Truncating must only ever shrink files, never pad them with zeros
+            shorter = (not os.path.exists(segment_path)
+                       or os.path.getsize(segment_path) < position["offset"]
+                       or (index_stat.st_size if index_stat is not None else 0) < position["index_offset"])
+            if compacted or shorter:
+                self.refresh_index()
+                return False
+
+            self.active_file.close()
+            self.maps = {}
+            for segment in self.segments():
+                if segment > position["segment"]:
+                    os.remove(self.segment_path(segment))
+            with open(segment_path, 'r+b') as f:
+                f.truncate(position["offset"])
+            if index_stat is not None:
+                with open(self.index_path, 'r+') as f:
+                    f.truncate(position["index_offset"])
+
+            self.index = {}
+            self.index_pos = 0
+            self.refresh_index()
+            self.active_segment = position["segment"]
+            self.active_file = open(segment_path, 'ab')
+        return True
+
+    def compact(self, keep=None):
+        """
+        Merge sealed segments into one, dropping records that are no longer needed
+
+        The highest segment is the one writers append to and is never touched, so a
+        running pipeline can keep writing while another process compacts.
+
+        Args:
+            keep (set, optional): Digests to retain, all indexed records when omitted
+
+        Returns:
+            int: Number of records dropped
+        """
+        if self.readonly:
+            raise RuntimeError("Evidence pack is opened read-only")
+
+        with self.lock, self.file_lock():
+            self.refresh_index()
+            segments = self.segments()
+            sealed = set(segments[:-1])
+            if not sealed:
+                return 0
+            # Reuse the lowest sealed number, it stays below the active segment
+            target = min(sealed)
+
+            new_index = {}
+            dropped = 0
+            sources = {}
+            temp_segment = self.segment_path(target) + ".tmp"
+            with open(temp_segment, 'wb') as out:
+                for key, (segment, offset, length) in sorted(self.index.items(), key=lambda item: item[1]):
+                    if segment not in sealed:
+                        new_index[key] = (segment, offset, length)
+                        continue
+                    if keep is not None and key not in keep:
+                        dropped += 1
+                        continue
+                    if segment not in sources:
+                        sources[segment] = open(self.segment_path(segment), 'rb')
+                    sources[segment].seek(offset)
+                    data = sources[segment].read(length)
+                    header_offset = out.tell()
+                    out.write(RECORD_HEADER.pack(RECORD_MAGIC, length, bytes.fromhex(key)))
+                    out.write(data)
+                    new_index[key] = (target, header_offset + RECORD_HEADER.size, length)
+            for f in sources.values():
+                f.close()
+
+            temp_index = self.index_path + ".tmp"
+            with open(temp_index, 'w') as f:
+                for key, (segment, offset, length) in new_index.items():
+                    f.write(f"{key} {segment} {offset} {length}\n")
+
+            # Readers wait on the lock, so they never pair the old index with the new segment
+            self.maps = {}
+            os.replace(temp_segment, self.segment_path(target))
+            os.replace(temp_index, self.index_path)
+            for segment in sealed - {target}:
+                os.remove(self.segment_path(segment))
+
+            self.index = new_index
+            self.index_pos = os.path.getsize(self.index_path)
+            self.index_inode = os.stat(self.index_path).st_ino
+        return dropped
+
+    def close(self):
+        """Close the active segment and any memory maps"""
+        with self.lock:
+            if self.active_file is not None:
+                self.active_file.close()
+                self.active_file = None
+            if self.lock_file is not None:
+                self.lock_file.close()
+                self.lock_file = None
+            self.maps = {}
+
+def referenced_digests(csv_file):
+    """
+    Collect pack digests referenced from the snapshot_path column of a speed CSV
+
+    Args:
+        csv_file (str): Path to the speed data CSV
+
+    Returns:
+        set: Referenced digests
+    """
+    digests = set()
+    with open(csv_file, 'r', newline='') as f:
+        for row in csv.reader(f):
+            if row and is_pack_ref(row[-1]):
+                digests.add(row[-1][len(REF_PREFIX):])
+    return digests
+
+def migrate_directory(snapshot_dir, pack, csv_file=None, remove=False):
+    """
+    Move existing JPEG snapshots into an evidence pack
+
+    Args:
+        snapshot_dir (str): Directory with vehicle_{id}_{timestamp}.jpg files
+        pack (EvidencePack): Destination pack
+        csv_file (str, optional): Speed CSV whose snapshot paths are rewritten to pack refs
+        remove (bool): Delete the JPEGs once they are packed
+
+    Returns:
+        dict: File name -> pack reference
+    """
+    refs = {}
+    for dirpath, _, filenames in os.walk(snapshot_dir):
+        for name in sorted(filenames):
+            if not name.lower().endswith((".jpg", ".jpeg")):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                refs[name] = pack.put(f.read())
+
+    if csv_file is not None and os.path.exists(csv_file):
+        temp_csv = csv_file + ".tmp"
+        with open(csv_file, 'r', newline='') as src, open(temp_csv, 'w', newline='') as dst:
+            writer = csv.writer(dst)
+            for row in csv.reader(src):
+                if row:
+                    # Old rows were written on Windows as well, normalise the separator
+                    name = row[-1].replace("\\", "/").rsplit("/", 1)[-1]
+                    if name in refs:
+                        row[-1] = refs[name]
+                writer.writerow(row)
+        os.replace(temp_csv, csv_file)
+
+    if remove:
+        for dirpath, _, filenames in os.walk(snapshot_dir):
+            for name in filenames:
+                if name in refs:
+                    os.remove(os.path.join(dirpath, name))
+    return refs
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain packed violation evidence")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate", help="Pack an existing snapshot directory")
+    migrate.add_argument("snapshot_dir")
+    migrate.add_argument("pack_dir")
+    migrate.add_argument("--csv", help="Speed CSV to rewrite with pack references")
+    migrate.add_argument("--remove", action="store_true", help="Delete JPEGs after packing")
+
+    compact = commands.add_parser("compact", help="Merge old segments and drop unreferenced records")
+    compact.add_argument("pack_dir")
+    compact.add_argument("--csv", action="append",
+                         help="Only keep records referenced from this speed CSV; repeat it or use a glob such "
+                              "as 'logs/*speed_data.csv' when several pipelines share the pack")
+
+    args = parser.parse_args()
+    pack = EvidencePack(args.pack_dir)
+    try:
+        if args.command == "migrate":
+            refs = migrate_directory(args.snapshot_dir, pack, csv_file=args.csv, remove=args.remove)
+            print(f"📦 Packed {len(refs)} snapshots into {args.pack_dir}")
+        else:
+            keep = None
+            if args.csv:
+                csv_files = sorted({path for pattern in args.csv for path in (glob.glob(pattern) or [pattern])})
+                keep = set()
+                for csv_file in csv_files:
+                    keep |= referenced_digests(csv_file)
+                print(f"🔎 Keeping records referenced from {', '.join(csv_files)}")
+            dropped = pack.compact(keep=keep)
+            print(f"🧹 Compacted {args.pack_dir}, dropped {dropped} records")
+    finally:
+        pack.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import re
+import json
+import queue
+import shutil
+import threading
+import subprocess
+import cv2
+import numpy as np
+
+class OpenCVFrameSource:
+    """
+    Frame source backed by cv2.VideoCapture, skipping frames with grab() only
+    """
+    def __init__(self, path, frame_step=1):
+        """
+        Open a video with OpenCV
+
+        Args:
+            path (str): Video file or stream URL
+            frame_step (int): Deliver every n-th frame; the others are grabbed but not decoded to BGR
+        """
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise IOError(f"Could not open video {path}")
+        self.frame_step = max(1, int(frame_step))
+        self.source_fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.fps = self.source_fps / self.frame_step if self.source_fps else 0.0
+        self.width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.pixel_scale = 1.0  # Source pixels per delivered pixel
+        self.frame_index = 0  # Source frames consumed so far
+        self.started = False
+
+    def read(self):
+        """
+        Read the next delivered frame
+
+        Returns:
+            tuple: (ok, frame, timestamp in seconds)
+        """
+        if self.started:
+            for _ in range(self.frame_step - 1):
+                if not self.cap.grab():
+                    return False, None, None
+                self.frame_index += 1
+        self.started = True
+
+        ret, frame = self.cap.read()
+        if not ret:
+            return False, None, None
+        self.frame_index += 1
+        return True, frame, self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+
+    def seek(self, frame_index, timestamp=None):
+        """
+        Continue after a previously delivered position, e.g. when resuming
+
+        Args:
+            frame_index (int): Source frames consumed when the position was recorded
+            timestamp (float, optional): Unused, the frame index is exact for OpenCV
+        """
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        self.frame_index = frame_index
+        self.started = frame_index > 0
+
+    def release(self):
+        self.cap.release()
+
+class FFmpegFrameSource:
+    """
+    Frame source that lets an FFmpeg subprocess decimate, scale and convert frames
+    """
+    SHOWINFO_PATTERN = re.compile(r"\bn:\s*(\d+)\s.*?pts_time:\s*([-0-9.]+)")
+
+    def __init__(self, path, width=None, frame_step=1, buffer_count=4, ffmpeg="ffmpeg", ffprobe="ffprobe"):
+        """
+        Start FFmpeg on a video
+
+        Args:
+            path (str): Video file or stream URL
+            width (int, optional): Inference width, height keeps the aspect ratio; source width if omitted
+            frame_step (int): Deliver every n-th frame, dropped inside FFmpeg before scaling
+            buffer_count (int): Reusable frame buffers; a returned frame stays valid for
+                buffer_count - 1 further reads, so keep it above any frames held by reference
+            ffmpeg (str): FFmpeg executable
+            ffprobe (str): FFprobe executable
+        """
+        source_width, source_height, source_fps = self.probe(path, ffprobe)
+        self.frame_step = max(1, int(frame_step))
+        self.source_fps = source_fps
+        self.fps = source_fps / self.frame_step if source_fps else 0.0
+        # Even dimensions keep every pixel format happy
+        self.width = int(width) if width else source_width
+        self.width -= self.width % 2
+        self.height = int(round(source_height * self.width / source_width / 2.0)) * 2
+        self.pixel_scale = source_width / self.width
+        self.path = path
+        self.ffmpeg = ffmpeg
+        self.frame_index = 0  # Delivered frames so far
+        self.last_timestamp = None
+        self.frame_bytes = self.width * self.height * 3
+
+        # Frames are returned as views over these buffers, which are reused round-robin
+        self.buffers = [bytearray(self.frame_bytes) for _ in range(max(2, buffer_count))]
+        self.views = [np.frombuffer(b, dtype=np.uint8).reshape(self.height, self.width, 3) for b in self.buffers]
+        self.next_buffer = 0
+
+        self.process = None
+        self._start()
+
+    def _start(self, start_time=None):
+        """Launch FFmpeg, optionally seeking to a presentation time first"""
+        filters = []
+        if self.frame_step > 1:
+            filters.append(f"select='not(mod(n\\,{self.frame_step}))'")
+        filters.append(f"scale={self.width}:{self.height}")
+        filters.append("showinfo")
+        command = [self.ffmpeg, "-hide_banner", "-nostdin", "-loglevel", "info"]
+        if start_time:
+            # Keep original timestamps so speeds and checkpoints stay comparable
+            command += ["-ss", f"{start_time:.6f}", "-copyts"]
+        command += ["-i", self.path, "-vf", ",".join(filters), "-vsync", "0", "-an",
+                    "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                        bufsize=self.frame_bytes)
+
+        # showinfo reports presentation times on stderr, one numbered line per delivered frame
+        self.timestamps = queue.Queue()
+        self.pending_timestamp = None
+        self.frames_read = 0  # Frames read from this FFmpeg process, matches showinfo's n
+        self.stderr_thread = threading.Thread(target=self._read_timestamps, args=(self.process, self.timestamps),
+                                              daemon=True)
+        self.stderr_thread.start()
+
+    @staticmethod
+    def probe(path, ffprobe="ffprobe"):
+        """
+        Read the size and frame rate of the first video stream
+
+        Returns:
+            tuple: (width, height, fps)
+        """
+        output = subprocess.check_output([ffprobe, "-v", "error", "-select_streams", "v:0",
+                                          "-show_entries", "stream=width,height,avg_frame_rate",
+                                          "-of", "json", path])
+        stream = json.loads(output)["streams"][0]
+        numerator, denominator = stream.get("avg_frame_rate", "0/1").split("/")
+        fps = float(numerator) / float(denominator) if float(denominator) else 0.0
+        return int(stream["width"]), int(stream["height"]), fps
+
+    def _read_timestamps(self, process, timestamps):
+        for line in iter(process.stderr.readline, b""):
+            if b"pts_time:" not in line:
+                continue
+            match = self.SHOWINFO_PATTERN.search(line.decode("utf-8", "replace"))
+            if match:
+                timestamps.put((int(match.group(1)), float(match.group(2))))
+
+    def _timestamp(self, number):
+        """
+        Presentation time of a frame, paired with showinfo output by frame number
+
+        Args:
+            number (int): Frame number within the current FFmpeg process
+
+        Returns:
+            float or None: Timestamp, estimated from the frame rate if showinfo output is late or missing
+        """
+        while True:
+            if self.pending_timestamp is None:
+                try:
+                    self.pending_timestamp = self.timestamps.get(timeout=5.0)
+                except queue.Empty:
+                    break
+            pending_number, timestamp = self.pending_timestamp
+            if pending_number < number:
+                # Arrived after its frame had been estimated, never reuse it for a later frame
+                self.pending_timestamp = None
+                continue
+            if pending_number == number:
+                self.pending_timestamp = None
+                return timestamp
+            # The line for this frame is missing, keep the later one for its own frame
+            break
+
+        if not self.fps:
+            return None
+        if self.last_timestamp is None:
+            return self.frame_index / self.fps
+        return self.last_timestamp + 1.0 / self.fps
+
+    def read(self):
+        """
+        Read the next delivered frame
+
+        Returns:
+            tuple: (ok, frame, timestamp in seconds); frame is a view over a reused buffer
+        """
+        view = memoryview(self.buffers[self.next_buffer])
+        filled = 0
+        while filled < self.frame_bytes:
+            count = self.process.stdout.readinto(view[filled:])
+            if not count:
+                return False, None, None
+            filled += count
+
+        frame = self.views[self.next_buffer]
+        self.next_buffer = (self.next_buffer + 1) % len(self.buffers)
+        timestamp = self._timestamp(self.frames_read)
+        self.frames_read += 1
+        self.last_timestamp = timestamp
+        self.frame_index += 1
+        return True, frame, timestamp
+
+    def seek(self, frame_index, timestamp=None):
+        """
+        Continue after a previously delivered position, e.g. when resuming
+
+        Args:
+            frame_index (int): Frames delivered when the position was recorded
+            timestamp (float, optional): Presentation time of the last delivered frame
+        """
+        self.release()
+        start_time = None
+        if timestamp is not None and self.source_fps:
+            # Land between the last delivered frame and the next one to deliver
+            start_time = timestamp + (self.frame_step - 0.5) / self.source_fps
+        self._start(start_time)
+        self.frame_index = frame_index
+        self.last_timestamp = timestamp
+
+    def release(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self.process.stdout.close()
+
+def open_frame_source(path, backend="opencv", width=None, frame_step=1, buffer_count=4):
+    """
+    Open a frame source, falling back to OpenCV when FFmpeg is not installed
+
+    Args:
+        path (str): Video file or stream URL
+        backend (str): "opencv" or "ffmpeg"
+        width (int, optional): Inference width for the FFmpeg backend
+        frame_step (int): Deliver every n-th frame
+        buffer_count (int): Reusable frame buffers for the FFmpeg backend
+
+    Returns:
+        OpenCVFrameSource or FFmpegFrameSource: Opened source
+    """
+    if backend == "ffmpeg":
+        if shutil.which("ffmpeg") and shutil.which("ffprobe"):
+            return FFmpegFrameSource(path, width=width, frame_step=frame_step, buffer_count=buffer_count)
+        print("⚠️ FFmpeg not found, falling back to OpenCV decoding")
+    return OpenCVFrameSource(path, frame_step=frame_step)
@@ -1,6 +1,8 @@
 import os
 import cv2
 import time
+import argparse
+import threading
 import logging
 from datetime import datetime
 import torch
@@ -9,15 +11,43 @@ import torch
 from vehicle_detection import VehicleDetector
 from vehicle_tracking import VehicleTracker
 from speed_calculation import SpeedCalculator
+from evidence import EvidenceRecorder
+from evidence_pack import EvidencePack
+from track_events import TrackEventStream, JsonlFileSink
+from vehicle_counting import VehicleCounter
+from motion_gate import MotionGate
+from frame_source import open_frame_source, FFmpegFrameSource
+from checkpoint import save_checkpoint, load_checkpoint, truncate_file
 from test_logging import setup_logger
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Traffic management system")
+    parser.add_argument("--decoder", choices=["opencv", "ffmpeg"], default="opencv",
+                        help="Frame source used to decode the video")
+    parser.add_argument("--frame-step", type=int, default=1,
+                        help="Process every n-th frame; skipped frames are never converted to BGR")
+    parser.add_argument("--width", type=int, default=None,
+                        help="Inference width for the FFmpeg decoder, keeps the aspect ratio")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the last checkpoint instead of frame 0")
+    parser.add_argument("--checkpoint-every", type=int, default=900,
+                        help="Frames between checkpoints, 0 disables checkpointing")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    
     # Setup paths
     input_video = "traffic.mp4"
     output_log = os.path.join("logs", "output.log")
     test_log = os.path.join("logs", "test.log")
     csv_file = os.path.join("logs", "speed_data.csv")
-    snapshot_dir = "snapshots"
+    events_file = os.path.join("logs", "events.jsonl")
+    counting_config = "counting.yaml"
+    motion_config = "motion_gate.yaml"
+    counts_file = os.path.join("logs", "counts.jsonl")
+    evidence_dir = "evidence"
+    checkpoint_file = os.path.join("logs", "checkpoint.json.gz")
     model_path = os.path.join("models", "yolov8n.pt")
     
     # Make sure the video file exists
@@ -28,7 +58,6 @@ def main():
     
     # Create directories if they don't exist
     os.makedirs(os.path.dirname(output_log), exist_ok=True)
-    os.makedirs(snapshot_dir, exist_ok=True)
     os.makedirs("data", exist_ok=True)
     os.makedirs("models", exist_ok=True)
     
@@ -44,66 +73,186 @@ def main():
     print(f"📝 Output log: {output_log}")
     print(f"📝 Test log: {test_log}")
     
+    # A checkpoint is only valid for the same video and decoding settings
+    run_config = {"input_video": input_video, "decoder": args.decoder,
+                  "frame_step": args.frame_step, "width": args.width}
+    checkpoint = None
+    if args.resume:
+        checkpoint = load_checkpoint(checkpoint_file)
+        if checkpoint is None:
+            print("ℹ️ No checkpoint found, starting from the beginning")
+        elif checkpoint["config"] != run_config:
+            print(f"❌ Checkpoint was written for {checkpoint['config']}, not {run_config}")
+            return
+        elif checkpoint.get("completed"):
+            print("✅ Checkpoint says this video was already processed completely")
+            return
+        else:
+            # Drop output written after the checkpoint so nothing is recorded twice
+            truncate_file(csv_file, checkpoint["offsets"]["csv"])
+            truncate_file(events_file, checkpoint["offsets"]["events"])
+            truncate_file(counts_file, checkpoint["offsets"].get("counts"))
+            main_logger.info(f"Resuming {input_video} at frame {checkpoint['frame_index']}")
+            print(f"⏯️ Resuming from frame {checkpoint['frame_index']}")
+    
     try:
         # Initialize components
         print(f"🔍 Loading vehicle detector model from: {model_path}")
         detector = VehicleDetector(model_path)
         
-        print("🔄 Initializing vehicle tracker")
-        tracker = VehicleTracker()
-        
         # Estimate speed factor (meters per pixel)
         speed_factor = 0.1  # Default value
         print(f"📏 Using speed factor: {speed_factor}")
         speed_calculator = SpeedCalculator(speed_factor)
         
+        print("🔄 Initializing vehicle tracker")
+        print(f"🛰️ Track events: {events_file}")
+        event_stream = TrackEventStream(JsonlFileSink(events_file),
+                                        summary_provider=speed_calculator.pop_summary)
+        tracker = VehicleTracker(event_stream=event_stream)
+        
+        # Line and lane counting is enabled by a counting.yaml next to main.py
+        counter = None
+        if os.path.exists(counting_config):
+            print(f"🔢 Counting with lines and lanes from: {counting_config}")
+            counts_sink = JsonlFileSink(counts_file)
+            counter = VehicleCounter.from_yaml(counting_config, class_ids=detector.vehicle_classes,
+                                               on_interval=counts_sink.emit)
+        
         # Set speed limit (km/h)
         speed_limit = 50
         print(f"🚦 Speed limit set to: {speed_limit} km/h")
         
         # Open video
-        print(f"📂 Opening video: {input_video}")
-        cap = cv2.VideoCapture(input_video)
-        if not cap.isOpened():
-            main_logger.error(f"Error: Could not open video {input_video}")
+        print(f"📂 Opening video: {input_video} ({args.decoder} decoder)")
+        evidence_frames = 8
+        try:
+            # Extra buffers keep frames referenced by the evidence ring valid
+            source = open_frame_source(input_video, backend=args.decoder, width=args.width,
+                                       frame_step=args.frame_step, buffer_count=evidence_frames + 2)
+        except (IOError, OSError) as e:
+            main_logger.error(f"Error: Could not open video {input_video}: {e}")
             print(f"❌ Error: Could not open video {input_video}")
             return
         
         # Get video properties
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = source.fps
+        frame_width = source.width
+        frame_height = source.height
         
         print(f"ℹ️ Video properties: {frame_width}x{frame_height} at {fps} FPS")
         main_logger.info(f"Video properties: {frame_width}x{frame_height} at {fps} FPS")
         
+        # The speed factor is calibrated in source pixels
+        speed_calculator.speed_factor *= source.pixel_scale
+        
+        # counting.yaml lines and lanes are given in source pixels as well
+        if counter is not None:
+            counter.rescale(1.0 / source.pixel_scale)
+        
+        # Skip the detector on frames without motion inside the road ROI from motion_gate.yaml
+        if os.path.exists(motion_config):
+            print(f"💤 Motion gate settings from: {motion_config}")
+            motion_gate = MotionGate.from_yaml(motion_config, pixel_scale=source.pixel_scale)
+        else:
+            motion_gate = MotionGate()
+        
         # Initialize CSV file with headers if it doesn't exist
         if not os.path.exists(csv_file):
             with open(csv_file, 'w') as f:
                 f.write("timestamp,vehicle_id,speed,snapshot_path\n")
         
+        # Evidence is cropped from clean frames and encoded off the main thread
+        print(f"📸 Writing evidence to: {evidence_dir}")
+        evidence_pack = EvidencePack(evidence_dir)
+        evidence = EvidenceRecorder(evidence_pack, buffer_size=evidence_frames,
+                                    copy_crops=isinstance(source, FFmpegFrameSource), logger=main_logger)
+        csv_lock = threading.Lock()
+        
+        if checkpoint is not None:
+            if not evidence_pack.rollback(checkpoint["offsets"]["evidence"]):
+                # Records encoded again after resuming are deduplicated by digest
+                print("⚠️ Evidence pack changed since the checkpoint (e.g. compacted), keeping it as is")
+                main_logger.warning("Evidence pack changed since the checkpoint, skipped its rollback")
+            tracker.set_state(checkpoint["tracker"])
+            speed_calculator.set_state(checkpoint["speed_calculator"])
+            event_stream.set_state(checkpoint["events"])
+            if counter is not None and checkpoint.get("counter") is not None:
+                counter.set_state(checkpoint["counter"])
+            source.seek(checkpoint["frame_index"], checkpoint["timestamp"])
+        
+        def write_checkpoint(frame_time, completed=False):
+            # Pending evidence must reach the CSV and the pack before offsets are taken
+            evidence.flush()
+            save_checkpoint(checkpoint_file, {
+                "config": run_config,
+                "completed": completed,
+                "frame_index": source.frame_index,
+                "timestamp": frame_time,
+                "tracker": tracker.get_state(),
+                "speed_calculator": speed_calculator.get_state(),
+                "events": event_stream.get_state(),
+                "counter": counter.get_state() if counter is not None else None,
+                "offsets": {
+                    "csv": os.path.getsize(csv_file),
+                    "events": event_stream.sink.tell(),
+                    "counts": counts_sink.tell() if counter is not None else None,
+                    "evidence": evidence_pack.tell()
+                }
+            })
+        
+        def record_violation(timestamp, vehicle_id, speed):
+            def write_row(snapshot_path):
+                # The recorder has already logged why the evidence is missing
+                if snapshot_path is None:
+                    return
+                with csv_lock, open(csv_file, 'a') as f:
+                    f.write(f"{timestamp},{vehicle_id},{speed:.1f},{snapshot_path}\n")
+                
+                # Log to test.log once the violation is on record
+                test_logger.warning(f"OVERSPEEDING: Vehicle ID {vehicle_id} detected at {speed:.1f} km/h, limit: {speed_limit} km/h")
+            return write_row
+        
         frame_count = 0
+        frame_time = checkpoint["timestamp"] if checkpoint is not None else None
+        completed = False
         start_time = time.time()
+        # Also reported when a resumed run is already at the end of the video
+        elapsed_time = 0.0
         
         print("▶️ Processing video...")
         while True:
-            ret, frame = cap.read()
+            last_frame_time = frame_time
+            ret, frame, frame_time = source.read()
             if not ret:
+                completed = True
+                frame_time = last_frame_time
                 break
             
             frame_count += 1
             if frame_count % 20 == 0:
                 print(f"📊 Processed {frame_count} frames...")
             
-            # Detect vehicles
-            detections = detector.detect(frame)
+            # Detect vehicles, unless the road is static and nothing is being tracked
+            if motion_gate.should_detect(frame, bool(tracker.tracks)):
+                detections = detector.detect(frame)
+            else:
+                detections = []
             
             # Track vehicles
-            tracked_vehicles = tracker.update(detections)
+            tracked_vehicles = tracker.update(detections, frame_time)
+            
+            # Count line crossings and lane occupancy
+            if counter is not None:
+                counter.update(tracked_vehicles, frame_time)
             
             # Calculate speeds
             speeds = speed_calculator.calculate_speeds(tracked_vehicles, fps)
             
+            # Keep the clean frame for evidence and annotate a copy
+            evidence.push_frame(frame, tracked_vehicles)
+            display_frame = frame.copy()
+            
             # Process each vehicle
             for vehicle_id, vehicle_data in speeds.items():
                 speed = vehicle_data["speed"]
@@ -111,47 +260,57 @@ def main():
                 
                 # Draw bounding box and speed
                 x1, y1, x2, y2 = bbox
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, f"ID: {vehicle_id}, {speed:.1f} km/h", 
+                cv2.rectangle(display_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
+                cv2.putText(display_frame, f"ID: {vehicle_id}, {speed:.1f} km/h", 
                         (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
                 
-                # Log speeding vehicles and save snapshots
+                # Log speeding vehicles and queue evidence
                 if speed > speed_limit:
                     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    snapshot_path = os.path.join(snapshot_dir, f"vehicle_{vehicle_id}_{timestamp}.jpg")
                     
-                    # Save snapshot
-                    vehicle_img = frame[max(0, y1):min(frame_height, y2), 
-                                    max(0, x1):min(frame_width, x2)]
-                    if vehicle_img.size > 0:
-                        cv2.imwrite(snapshot_path, vehicle_img)
-                        
-                        # Log to test.log
-                        test_logger.warning(f"OVERSPEEDING: Vehicle ID {vehicle_id} detected at {speed:.1f} km/h, limit: {speed_limit} km/h")
-                        
-                        # Save to CSV
-                        with open(csv_file, 'a') as f:
-                            f.write(f"{timestamp},{vehicle_id},{speed:.1f},{snapshot_path}\n")
+                    # One evidence image per vehicle per second, like the old snapshot names
+                    evidence.submit(vehicle_id, key=(vehicle_id, timestamp),
+                                    on_done=record_violation(timestamp, vehicle_id, speed))
             
             # Display FPS on frame
             elapsed_time = time.time() - start_time
             fps_actual = frame_count / elapsed_time if elapsed_time > 0 else 0
-            cv2.putText(frame, f"FPS: {fps_actual:.1f}", (10, 30), 
+            cv2.putText(display_frame, f"FPS: {fps_actual:.1f}", (10, 30), 
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
             
             # Display frame
-            cv2.imshow("Traffic Management", frame)
+            cv2.imshow("Traffic Management", display_frame)
+            
+            # Save progress for --resume
+            if args.checkpoint_every and frame_count % args.checkpoint_every == 0:
+                write_checkpoint(frame_time)
             
             # Check for key press to exit
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
         
+        # Record where we stopped before live tracks are finalized
+        if args.checkpoint_every:
+            write_checkpoint(frame_time, completed=completed)
+        
         # Cleanup
-        cap.release()
+        source.release()
+        tracker.flush()
+        event_stream.close()
+        if counter is not None:
+            counter.flush()
+            counts_sink.close()
+        evidence.close()
+        evidence_pack.close()
         cv2.destroyAllWindows()
         main_logger.info(f"Processing complete. Processed {frame_count} frames in {elapsed_time:.2f} seconds")
         print(f"✅ Processing complete. Processed {frame_count} frames in {elapsed_time:.2f} seconds")
         
+        gate_stats = motion_gate.stats()
+        main_logger.info(f"Motion gate stats for {input_video}: {gate_stats}")
+        print(f"💤 Detector skipped on {gate_stats['skipped']} of {gate_stats['frames']} frames "
+              f"({gate_stats['skip_ratio']:.1%})")
+        
     except Exception as e:
         main_logger.error(f"Error in main: {e}")
         print(f"❌ Error occurred: {e}")
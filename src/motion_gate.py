@@ -0,0 +1,159 @@
+import cv2
+import numpy as np
+
+class MotionGate:
+    """
+    Cheap motion check that decides whether a frame needs the vehicle detector
+    """
+    def __init__(self, roi=None, scale=0.25, pixel_threshold=25, min_motion_ratio=0.002,
+                 method="diff", max_skipped=150):
+        """
+        Initialize the motion gate
+
+        Args:
+            roi (list, optional): Road polygon [(x, y), ...] in full-frame pixels, whole frame if omitted
+            scale (float): Downscale factor applied before the motion test
+            pixel_threshold (int): Grey-level change that marks a pixel as moving (frame differencing)
+            min_motion_ratio (float): Fraction of ROI pixels that must move to count as motion
+            method (str): "diff" for frame differencing or "mog2" for background subtraction
+            max_skipped (int): Run the detector after this many skipped frames regardless, 0 disables
+        """
+        if method not in ("diff", "mog2"):
+            raise ValueError(f"Unknown motion gate method: {method}")
+
+        self.roi = roi
+        self.scale = scale
+        self.pixel_threshold = pixel_threshold
+        self.min_motion_ratio = min_motion_ratio
+        self.method = method
+        self.max_skipped = max_skipped
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(detectShadows=False) if method == "mog2" else None
+        self.previous = None
+        self.mask = None
+        self.mask_pixels = 0
+        self.skipped_in_row = 0
+
+        # Per-stream statistics
+        self.frames = 0
+        self.motion_frames = 0
+        self.detected = 0
+        self.skipped = 0
+
+    @classmethod
+    def from_config(cls, config, pixel_scale=1.0):
+        """
+        Build a gate from a dict of constructor options
+
+        Args:
+            config (dict): Any of roi, scale, pixel_threshold, min_motion_ratio, method and max_skipped;
+                the roi is given in source video pixels
+            pixel_scale (float): Source pixels per delivered pixel, see the frame sources
+
+        Returns:
+            MotionGate: Configured gate
+        """
+        options = dict(config or {})
+        unknown = set(options) - {"roi", "scale", "pixel_threshold", "min_motion_ratio", "method", "max_skipped"}
+        if unknown:
+            raise ValueError(f"Unknown motion gate options: {', '.join(sorted(unknown))}")
+        if options.get("roi"):
+            options["roi"] = [(x / pixel_scale, y / pixel_scale) for x, y in options["roi"]]
+        return cls(**options)
+
+    @classmethod
+    def from_yaml(cls, path, pixel_scale=1.0):
+        """
+        Build a gate from a YAML file with the options accepted by from_config
+
+        Args:
+            path (str): Path to the YAML configuration
+            pixel_scale (float): Source pixels per delivered pixel
+
+        Returns:
+            MotionGate: Configured gate
+        """
+        import yaml
+        with open(path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+        return cls.from_config(config, pixel_scale=pixel_scale)
+
+    def _prepare(self, frame):
+        """Downscale, convert to grey and blur a frame"""
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        if self.mask is None:
+            self.mask = np.zeros(gray.shape, dtype=np.uint8)
+            if self.roi:
+                points = np.round(np.array(self.roi, dtype=np.float64) * self.scale).astype(np.int32)
+                cv2.fillPoly(self.mask, [points], 255)
+            else:
+                self.mask[:] = 255
+            self.mask_pixels = max(cv2.countNonZero(self.mask), 1)
+        return gray
+
+    def has_motion(self, frame):
+        """
+        Check whether anything moves inside the ROI
+
+        Args:
+            frame (numpy.ndarray): Full-resolution BGR frame
+
+        Returns:
+            bool: True if the moving pixel ratio reaches min_motion_ratio
+        """
+        gray = self._prepare(frame)
+        if self.subtractor is not None:
+            moving = self.subtractor.apply(gray)
+        else:
+            if self.previous is None:
+                self.previous = gray
+                return True
+            diff = cv2.absdiff(gray, self.previous)
+            self.previous = gray
+            _, moving = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+
+        moving = cv2.bitwise_and(moving, self.mask)
+        return cv2.countNonZero(moving) / self.mask_pixels >= self.min_motion_ratio
+
+    def should_detect(self, frame, live_tracks):
+        """
+        Decide whether to run the detector on this frame
+
+        Args:
+            frame (numpy.ndarray): Full-resolution BGR frame
+            live_tracks (bool): Whether VehicleTracker still holds any track
+
+        Returns:
+            bool: True if the detector should run
+        """
+        self.frames += 1
+        # Always feed the gate so its reference frame stays current
+        motion = self.has_motion(frame)
+        if motion:
+            self.motion_frames += 1
+
+        run = motion or live_tracks or (self.max_skipped and self.skipped_in_row >= self.max_skipped)
+        if run:
+            self.detected += 1
+            self.skipped_in_row = 0
+        else:
+            self.skipped += 1
+            self.skipped_in_row += 1
+        return bool(run)
+
+    def stats(self):
+        """
+        Skip statistics for this stream
+
+        Returns:
+            dict: Frame, motion, detected and skipped counts plus the skip ratio
+        """
+        return {
+            "frames": self.frames,
+            "motion_frames": self.motion_frames,
+            "detected": self.detected,
+            "skipped": self.skipped,
+            "skip_ratio": self.skipped / self.frames if self.frames else 0.0
+        }
@@ -1,16 +1,21 @@
 import numpy as np
 import math
+from collections import deque
 
 class SpeedCalculator:
-    def __init__(self, speed_factor=0.1):
+    def __init__(self, speed_factor=0.1, history_size=256):
         """
         Initialize the speed calculator
         
         Args:
             speed_factor (float): Calibration factor to convert pixel distance to real-world speed
+            history_size (int): Speeds kept per vehicle for the track summary
         """
         self.speed_factor = speed_factor
         self.previous_speeds = {}  # Store previous speeds for smoothing
+        self.history_size = history_size
+        self.speed_history = {}  # Recent speeds per vehicle for summaries
+        self.max_speeds = {}
         
     def calculate_distance(self, point1, point2):
         """Calculate Euclidean distance between two points"""
@@ -22,7 +27,7 @@ class SpeedCalculator:
         
         Args:
             tracked_vehicles (dict): Dictionary of tracked vehicles
-            fps (float): Frames per second of the video
+            fps (float): Frames per second of the video, used when tracks carry no timestamps
             
         Returns:
             dict: Dictionary with vehicle speeds
@@ -43,11 +48,21 @@ class SpeedCalculator:
             if not distances:
                 continue
                 
-            # Use average of last few distances to smooth speed calculation
-            avg_distance = np.mean(distances)
-            
-            # Calculate speed (pixels per second)
-            pixels_per_second = avg_distance * fps
+            # Prefer presentation timestamps, they stay correct with skipped or uneven frames
+            timestamps = vehicle_data.get('timestamps', [])
+            elapsed = None
+            if len(timestamps) == len(positions) and None not in (timestamps[-1], timestamps[-len(distances)-1]):
+                elapsed = timestamps[-1] - timestamps[-len(distances)-1]
+                
+            if elapsed is not None and elapsed > 0:
+                # Calculate speed (pixels per second) over the same window
+                pixels_per_second = sum(distances) / elapsed
+            else:
+                # Use average of last few distances to smooth speed calculation
+                avg_distance = np.mean(distances)
+                
+                # Calculate speed (pixels per second)
+                pixels_per_second = avg_distance * fps
             
             # Convert to km/h using speed factor
             speed_kmh = pixels_per_second * self.speed_factor
@@ -59,6 +74,10 @@ class SpeedCalculator:
                 
             # Store for next frame
             self.previous_speeds[vehicle_id] = speed_kmh
+            if vehicle_id not in self.speed_history:
+                self.speed_history[vehicle_id] = deque(maxlen=self.history_size)
+            self.speed_history[vehicle_id].append(speed_kmh)
+            self.max_speeds[vehicle_id] = max(speed_kmh, self.max_speeds.get(vehicle_id, 0.0))
             
             # Store result
             results[vehicle_id] = {
@@ -67,6 +86,48 @@ class SpeedCalculator:
             }
             
         return results
+    
+    def pop_summary(self, vehicle_id):
+        """
+        Summarize and forget the speeds measured for a vehicle
+        
+        Args:
+            vehicle_id (int): Vehicle ID
+            
+        Returns:
+            dict: Maximum and median speed in km/h, None when never measured
+        """
+        history = self.speed_history.pop(vehicle_id, None)
+        max_speed = self.max_speeds.pop(vehicle_id, None)
+        self.previous_speeds.pop(vehicle_id, None)
+        return {
+            "max_speed": float(max_speed) if max_speed is not None else None,
+            "median_speed": float(np.median(history)) if history else None
+        }
+
+    def get_state(self):
+        """
+        Snapshot the smoothing and summary state for checkpointing
+        
+        Returns:
+            dict: JSON-serializable state
+        """
+        return {
+            "previous_speeds": {str(k): float(v) for k, v in self.previous_speeds.items()},
+            "speed_history": {str(k): [float(v) for v in h] for k, h in self.speed_history.items()},
+            "max_speeds": {str(k): float(v) for k, v in self.max_speeds.items()}
+        }
+    
+    def set_state(self, state):
+        """
+        Restore a snapshot taken with get_state
+        
+        Args:
+            state (dict): Calculator state
+        """
+        self.previous_speeds = {int(k): v for k, v in state["previous_speeds"].items()}
+        self.speed_history = {int(k): deque(h, maxlen=self.history_size) for k, h in state["speed_history"].items()}
+        self.max_speeds = {int(k): v for k, v in state["max_speeds"].items()}
 
 # Stand-alone function for external use
 def estimate_speed(positions, fps, speed_factor=0.1):
@@ -0,0 +1,163 @@
+import json
+import socket
+
+class CallbackSink:
+    """
+    Delivers track events to an in-process callback
+    """
+    def __init__(self, callback):
+        """
+        Args:
+            callback (callable): Called with each event dictionary
+        """
+        self.callback = callback
+
+    def emit(self, event):
+        self.callback(event)
+
+    def close(self):
+        pass
+
+class JsonlFileSink:
+    """
+    Appends track events to a JSON Lines file
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Output file, opened in append mode
+        """
+        self.path = path
+        self.file = open(path, 'a')
+
+    def emit(self, event):
+        self.file.write(json.dumps(event) + "\n")
+
+    def tell(self):
+        """Flush and return the current file size, used for checkpoints"""
+        self.file.flush()
+        return self.file.tell()
+
+    def close(self):
+        self.file.close()
+
+class SocketSink:
+    """
+    Sends each track event as a JSON datagram to a local UDP port
+    """
+    def __init__(self, port, host="127.0.0.1"):
+        """
+        Args:
+            port (int): Destination port
+            host (str): Destination host, local by default
+        """
+        self.address = (host, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def emit(self, event):
+        try:
+            self.sock.sendto(json.dumps(event).encode("utf-8"), self.address)
+        except OSError:
+            # Nobody listening is not an error for a fire-and-forget stream
+            pass
+
+    def close(self):
+        self.sock.close()
+
+class TrackEventStream:
+    """
+    Turns tracker state changes into a compact stream of lifecycle events
+    """
+    def __init__(self, sink, update_interval=30, max_path_points=64, summary_provider=None, fps=None):
+        """
+        Initialize the event stream
+
+        Args:
+            sink: Object with emit(event) and close() methods
+            update_interval (int): Frames between "updated" events for a live track, 0 disables them
+            max_path_points (int): Maximum points kept in the finalized path
+            summary_provider (callable, optional): track_id -> dict merged into the finalized event,
+                e.g. SpeedCalculator.pop_summary
+            fps (float, optional): Used for durations when the tracker gets no timestamps
+        """
+        self.sink = sink
+        self.update_interval = update_interval
+        self.max_path_points = max_path_points
+        self.summary_provider = summary_provider
+        self.fps = fps
+        self.last_emitted = {}  # track_id -> frame of the last event
+        self.paths = {}  # track_id -> sampled centre points
+
+    def _event(self, kind, track_id, track, frame, timestamp):
+        return {
+            "event": kind,
+            "track_id": track_id,
+            "frame": frame,
+            "timestamp": timestamp,
+            "class_id": track['class_id'],
+            "bbox": list(track['bbox'])
+        }
+
+    def _sample(self, track_id, track):
+        path = self.paths.setdefault(track_id, [])
+        point = list(track['positions'][-1])
+        if not path or path[-1] != point:
+            path.append(point)
+        if len(path) > self.max_path_points:
+            # Drop every other point but keep both ends
+            self.paths[track_id] = path[:-1:2] + [path[-1]]
+
+    def confirmed(self, track_id, track, frame, timestamp):
+        """Emit when a track collects enough hits to become active"""
+        self.last_emitted[track_id] = frame
+        self.paths[track_id] = [list(p) for p in track['positions'][:1]]
+        self._sample(track_id, track)
+        self.sink.emit(self._event("confirmed", track_id, track, frame, timestamp))
+
+    def updated(self, track_id, track, frame, timestamp):
+        """Emit a periodic update for a matched, confirmed track"""
+        if not self.update_interval or frame - self.last_emitted.get(track_id, frame) < self.update_interval:
+            return
+        self.last_emitted[track_id] = frame
+        self._sample(track_id, track)
+        event = self._event("updated", track_id, track, frame, timestamp)
+        event["hits"] = track['hits']
+        self.sink.emit(event)
+
+    def lost(self, track_id, track, frame, timestamp):
+        """Emit when a confirmed track first misses a detection"""
+        self.last_emitted[track_id] = frame
+        self.sink.emit(self._event("lost", track_id, track, frame, timestamp))
+
+    def finalized(self, track_id, track, frame, timestamp):
+        """Emit a summary when a confirmed track is removed"""
+        self._sample(track_id, track)
+        event = self._event("finalized", track_id, track, frame, timestamp)
+        if track.get('first_seen') is not None and track.get('last_seen') is not None:
+            event["duration"] = track['last_seen'] - track['first_seen']
+        elif self.fps:
+            event["duration"] = (track['last_frame'] - track['first_frame']) / self.fps
+        else:
+            event["duration"] = None
+        event["frames"] = track['last_frame'] - track['first_frame'] + 1
+        event["hits"] = track['hits']
+        event["path"] = self.paths.pop(track_id, [])
+        self.last_emitted.pop(track_id, None)
+        if self.summary_provider is not None:
+            event.update(self.summary_provider(track_id))
+        self.sink.emit(event)
+
+    def get_state(self):
+        """JSON-serializable per-track state, used for checkpoints"""
+        return {
+            "last_emitted": {str(k): v for k, v in self.last_emitted.items()},
+            "paths": {str(k): v for k, v in self.paths.items()}
+        }
+
+    def set_state(self, state):
+        """Restore per-track state saved with get_state"""
+        self.last_emitted = {int(k): v for k, v in state["last_emitted"].items()}
+        self.paths = {int(k): v for k, v in state["paths"].items()}
+
+    def close(self):
+        self.sink.close()
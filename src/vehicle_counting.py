@@ -0,0 +1,279 @@
+import numpy as np
+from collections import deque
+
+# COCO class names for VehicleDetector.vehicle_classes
+CLASS_NAMES = {2: "car", 3: "motorcycle", 5: "bus", 7: "truck"}
+
+class VehicleCounter:
+    """
+    Counts line crossings and lane occupancy from tracked vehicle positions
+    """
+    def __init__(self, lines, lanes=None, interval=60.0, class_ids=(2, 3, 5, 7), on_interval=None, history_size=60):
+        """
+        Initialize the counter
+
+        Args:
+            lines (list): Virtual lines as {'name', 'start': (x, y), 'end': (x, y)};
+                crossings from the left to the right of start->end as seen in the image count as
+                "forward", e.g. moving down the screen across a line drawn left to right"
+            lanes (list, optional): Lane polygons as {'name', 'points': [(x, y), ...]}
+            interval (float): Aggregation interval in seconds
+            class_ids (tuple): Class IDs counted separately, e.g. VehicleDetector.vehicle_classes
+            on_interval (callable, optional): Called with each finished interval summary
+            history_size (int): Number of finished intervals kept in memory
+        """
+        self.line_names = [line['name'] for line in lines]
+        self.line_starts = np.array([line['start'] for line in lines], dtype=np.float64).reshape(-1, 2)
+        self.line_ends = np.array([line['end'] for line in lines], dtype=np.float64).reshape(-1, 2)
+        self.lanes = [(lane['name'], np.array(lane['points'], dtype=np.float64)) for lane in (lanes or [])]
+        self.interval = interval
+        self.class_ids = list(class_ids)
+        self.class_index = {class_id: i for i, class_id in enumerate(self.class_ids)}
+        self.on_interval = on_interval
+        self.history = deque(maxlen=history_size)
+
+        # Fixed-size accumulators for the current interval
+        self.counts = np.zeros((len(self.line_names), 2, len(self.class_ids)), dtype=np.int64)
+        self.occupied_time = np.zeros(len(self.lanes))
+        self.vehicle_time = np.zeros((len(self.lanes), len(self.class_ids)))
+        self.interval_start = None
+        self.last_timestamp = None
+        self.counted = set()  # (track_id, line index) already counted
+
+    @classmethod
+    def from_yaml(cls, path, **kwargs):
+        """
+        Build a counter from a YAML file with 'lines', 'lanes' and 'interval' keys
+
+        Args:
+            path (str): Path to the YAML configuration
+
+        Returns:
+            VehicleCounter: Configured counter
+        """
+        import yaml
+        with open(path, 'r') as f:
+            config = yaml.safe_load(f) or {}
+        return cls(config.get('lines', []), lanes=config.get('lanes'),
+                   interval=config.get('interval', 60.0), **kwargs)
+
+    def rescale(self, factor):
+        """
+        Multiply every line and lane coordinate, e.g. to map source pixels to a downscaled frame
+
+        Args:
+            factor (float): Delivered pixels per configured pixel
+        """
+        self.line_starts *= factor
+        self.line_ends *= factor
+        self.lanes = [(name, polygon * factor) for name, polygon in self.lanes]
+
+    def crossings(self, prev_points, curr_points):
+        """
+        Test every move against every line at once
+
+        Args:
+            prev_points (numpy.ndarray): (n, 2) previous centres
+            curr_points (numpy.ndarray): (n, 2) current centres
+
+        Returns:
+            tuple: (n, m) boolean crossing matrix and (n, m) forward-direction matrix
+        """
+        a = self.line_starts[None, :, :]
+        b = self.line_ends[None, :, :]
+        p = prev_points[:, None, :]
+        q = curr_points[:, None, :]
+
+        def cross(u, v):
+            return u[..., 0] * v[..., 1] - u[..., 1] * v[..., 0]
+
+        # Which side of each line the move starts and ends on
+        side_p = cross(b - a, p - a) > 0
+        side_q = cross(b - a, q - a) > 0
+        # Whether the line's end points lie on opposite sides of the move
+        d3 = cross(q - p, a - p)
+        d4 = cross(q - p, b - p)
+        crossed = (side_p != side_q) & (d3 * d4 <= 0)
+        return crossed, side_q
+
+    def inside(self, points, polygon):
+        """Vectorized ray-casting test of points against one polygon"""
+        x = points[:, 0:1]
+        y = points[:, 1:2]
+        x1 = polygon[:, 0][None, :]
+        y1 = polygon[:, 1][None, :]
+        x2 = np.roll(polygon[:, 0], -1)[None, :]
+        y2 = np.roll(polygon[:, 1], -1)[None, :]
+        straddles = (y1 > y) != (y2 > y)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+        hits = straddles & (x < x_cross)
+        return np.count_nonzero(hits, axis=1) % 2 == 1
+
+    def update(self, tracked_vehicles, timestamp):
+        """
+        Update counts with the tracks of the current frame
+
+        Args:
+            tracked_vehicles (dict): Tracks returned by VehicleTracker.update
+            timestamp (float): Frame time in seconds
+
+        Returns:
+            list: Crossing dictionaries for this frame
+        """
+        live_ids = set(tracked_vehicles.keys())
+        dt = 0.0 if self.last_timestamp is None else max(0.0, timestamp - self.last_timestamp)
+
+        ids = []
+        classes = []
+        prev_points = []
+        curr_points = []
+        present = []
+        for track_id, track in tracked_vehicles.items():
+            if track['class_id'] not in self.class_index:
+                continue
+            ids.append(track_id)
+            classes.append(self.class_index[track['class_id']])
+            positions = track['positions']
+            # Only tracks matched in this frame moved
+            moved = track['age'] == 0 and len(positions) >= 2
+            prev_points.append(positions[-2] if moved else positions[-1])
+            curr_points.append(positions[-1])
+            # Coasting tracks only repeat their last position and do not occupy a lane
+            present.append(track['age'] == 0)
+
+        classes = np.array(classes, dtype=np.int64)
+        prev_points = np.array(prev_points, dtype=np.float64).reshape(-1, 2)
+        curr_points = np.array(curr_points, dtype=np.float64).reshape(-1, 2)
+        present = np.array(present, dtype=bool)
+
+        lane_masks = []
+        if dt > 0 and present.any():
+            for _, polygon in self.lanes:
+                lane_masks.append(present & self.inside(curr_points, polygon))
+
+        if self.interval_start is None:
+            self.interval_start = timestamp
+        last_timestamp = self.last_timestamp
+        while timestamp - self.interval_start >= self.interval:
+            # Split the frame time at the boundary so each interval gets its own share
+            boundary = self.interval_start + self.interval
+            head = min(dt, max(0.0, boundary - last_timestamp)) if last_timestamp is not None else 0.0
+            self.occupy(lane_masks, classes, head)
+            dt -= head
+            last_timestamp = boundary
+            self.close_interval(boundary)
+        self.occupy(lane_masks, classes, dt)
+        self.last_timestamp = timestamp
+
+        # Crossing memory only needs the tracks that can still cross a line
+        if self.counted:
+            self.counted = {key for key in self.counted if key[0] in live_ids}
+
+        events = []
+        if not ids or not len(self.line_names):
+            return events
+
+        crossed, forward = self.crossings(prev_points, curr_points)
+        for i, j in zip(*np.nonzero(crossed)):
+            key = (ids[i], int(j))
+            if key in self.counted:
+                continue
+            self.counted.add(key)
+            direction = 0 if forward[i, j] else 1
+            self.counts[j, direction, classes[i]] += 1
+            events.append({
+                "track_id": ids[i],
+                "line": self.line_names[j],
+                "direction": "forward" if direction == 0 else "backward",
+                "class_id": self.class_ids[classes[i]],
+                "timestamp": timestamp,
+                "point": curr_points[i].tolist()
+            })
+
+        return events
+
+    def occupy(self, lane_masks, classes, dt):
+        """Add dt seconds of occupancy for the vehicles inside each lane"""
+        if dt <= 0:
+            return
+        for k, in_lane in enumerate(lane_masks):
+            if in_lane.any():
+                self.occupied_time[k] += dt
+                self.vehicle_time[k] += np.bincount(classes[in_lane], minlength=len(self.class_ids)) * dt
+
+    def summary(self, end_time):
+        """Summarize the current interval"""
+        duration = max(end_time - self.interval_start, 1e-9)
+        names = [CLASS_NAMES.get(class_id, str(class_id)) for class_id in self.class_ids]
+        lines = {}
+        for j, name in enumerate(self.line_names):
+            lines[name] = {
+                "forward": dict(zip(names, self.counts[j, 0].tolist())),
+                "backward": dict(zip(names, self.counts[j, 1].tolist())),
+                "flow_per_hour": float(self.counts[j].sum() * 3600.0 / duration)
+            }
+        lanes = {}
+        for k, (name, _) in enumerate(self.lanes):
+            lanes[name] = {
+                "occupancy": float(self.occupied_time[k] / duration),
+                "mean_vehicles": dict(zip(names, (self.vehicle_time[k] / duration).tolist()))
+            }
+        return {"start": self.interval_start, "end": end_time, "lines": lines, "lanes": lanes}
+
+    def close_interval(self, end_time):
+        """
+        Finish the current interval and reset the accumulators
+
+        Args:
+            end_time (float): Interval end in seconds
+
+        Returns:
+            dict: Interval summary
+        """
+        summary = self.summary(end_time)
+        self.history.append(summary)
+        if self.on_interval is not None:
+            self.on_interval(summary)
+
+        self.counts[:] = 0
+        self.occupied_time[:] = 0
+        self.vehicle_time[:] = 0
+        self.interval_start = end_time
+        return summary
+
+    def get_state(self):
+        """
+        Snapshot the current interval for checkpointing
+
+        Returns:
+            dict: JSON-serializable counter state
+        """
+        return {
+            "counts": self.counts.tolist(),
+            "occupied_time": self.occupied_time.tolist(),
+            "vehicle_time": self.vehicle_time.tolist(),
+            "interval_start": self.interval_start,
+            "last_timestamp": self.last_timestamp,
+            "counted": [list(key) for key in self.counted]
+        }
+
+    def set_state(self, state):
+        """
+        Restore a snapshot taken with get_state
+
+        Args:
+            state (dict): Counter state
+        """
+        self.counts[:] = np.array(state["counts"], dtype=np.int64).reshape(self.counts.shape)
+        self.occupied_time[:] = np.array(state["occupied_time"]).reshape(self.occupied_time.shape)
+        self.vehicle_time[:] = np.array(state["vehicle_time"]).reshape(self.vehicle_time.shape)
+        self.interval_start = state["interval_start"]
+        self.last_timestamp = state["last_timestamp"]
+        self.counted = {tuple(key) for key in state["counted"]}
+
+    def flush(self):
+        """Close the last, partial interval, e.g. at the end of a video"""
+        if self.interval_start is None or self.last_timestamp is None:
+            return None
+        return self.close_interval(self.last_timestamp)
@@ -2,7 +2,7 @@ import numpy as np
 from scipy.optimize import linear_sum_assignment
 
 class VehicleTracker:
-    def __init__(self, max_age=10, min_hits=3, iou_threshold=0.3):
+    def __init__(self, max_age=10, min_hits=3, iou_threshold=0.3, event_stream=None):
         """
         Initialize the vehicle tracker
         
@@ -10,12 +10,16 @@ class VehicleTracker:
             max_age (int): Maximum frames to keep a track alive without matching
             min_hits (int): Minimum hits needed to establish a track
             iou_threshold (float): IOU threshold for matching detections to tracks
+            event_stream (TrackEventStream, optional): Receives track lifecycle events
         """
         self.max_age = max_age
         self.min_hits = min_hits
         self.iou_threshold = iou_threshold
+        self.event_stream = event_stream
         self.tracks = {}
         self.next_id = 1
+        self.frame_index = 0
+        self.timestamp = None
 
     def iou(self, bbox1, bbox2):
         """Calculate IoU between two bounding boxes"""
@@ -46,37 +50,64 @@ class VehicleTracker:
         x1, y1, x2, y2 = bbox
         return ((x1 + x2) // 2, (y1 + y2) // 2)
 
-    def update(self, detections):
+    def new_track(self, det):
+        """Start a tentative track from an unmatched detection"""
+        self.tracks[self.next_id] = {
+            'bbox': det['bbox'],
+            'hits': 1,
+            'age': 0,
+            'active': False,
+            'class_id': det['class_id'],
+            'positions': [self.get_center(det['bbox'])],
+            'timestamps': [self.timestamp],
+            'first_frame': self.frame_index,
+            'last_frame': self.frame_index,
+            'first_seen': self.timestamp,
+            'last_seen': self.timestamp
+        }
+        self.next_id += 1
+
+    def miss_track(self, track_id):
+        """Age a track that was not matched in this frame"""
+        track = self.tracks[track_id]
+        track['age'] += 1
+        if track['age'] == 1 and track['active'] and self.event_stream is not None:
+            self.event_stream.lost(track_id, track, self.frame_index, self.timestamp)
+
+    def remove_track(self, track_id):
+        """Drop a track, emitting its summary if it was ever confirmed"""
+        track = self.tracks.pop(track_id)
+        if track['active'] and self.event_stream is not None:
+            self.event_stream.finalized(track_id, track, self.frame_index, self.timestamp)
+
+    def update(self, detections, timestamp=None):
         """
         Update tracks with new detections
         
         Args:
             detections (list): List of detection dictionaries
+            timestamp (float, optional): Presentation time of the frame in seconds
             
         Returns:
             dict: Updated tracks
         """
+        self.frame_index += 1
+        self.timestamp = timestamp
+        
         # If no tracks yet, initialize with current detections
         if not self.tracks:
             for det in detections:
-                self.tracks[self.next_id] = {
-                    'bbox': det['bbox'],
-                    'hits': 1,
-                    'age': 0,
-                    'active': False,
-                    'class_id': det['class_id'],
-                    'positions': [self.get_center(det['bbox'])]
-                }
-                self.next_id += 1
-            return self.tracks
+                self.new_track(det)
+            return {k: v for k, v in self.tracks.items() if v['active']}
             
         # If no detections, increment age of all tracks
         if not detections:
             for track_id in list(self.tracks.keys()):
-                self.tracks[track_id]['age'] += 1
+                self.miss_track(track_id)
                 if self.tracks[track_id]['age'] > self.max_age:
-                    del self.tracks[track_id]
-            return self.tracks
+                    self.remove_track(track_id)
+            # Tentative tracks are never finalized, so callers must not keep state for them
+            return {k: v for k, v in self.tracks.items() if v['active']}
             
         # Calculate IoU between each detection and each track
         cost_matrix = np.zeros((len(self.tracks), len(detections)))
@@ -107,9 +138,17 @@ class VehicleTracker:
             self.tracks[track_id]['age'] = 0
             self.tracks[track_id]['class_id'] = detections[j]['class_id']
             self.tracks[track_id]['positions'].append(self.get_center(detections[j]['bbox']))
+            self.tracks[track_id]['timestamps'].append(timestamp)
+            self.tracks[track_id]['last_frame'] = self.frame_index
+            self.tracks[track_id]['last_seen'] = timestamp
             
             # Mark track as active if it has enough hits
             if self.tracks[track_id]['hits'] >= self.min_hits:
+                if self.event_stream is not None:
+                    if self.tracks[track_id]['active']:
+                        self.event_stream.updated(track_id, self.tracks[track_id], self.frame_index, timestamp)
+                    else:
+                        self.event_stream.confirmed(track_id, self.tracks[track_id], self.frame_index, timestamp)
                 self.tracks[track_id]['active'] = True
                 
             # Mark as matched
@@ -118,30 +157,58 @@ class VehicleTracker:
             
         # Handle unmatched detections
         for j in unmatched_detections:
-            self.tracks[self.next_id] = {
-                'bbox': detections[j]['bbox'],
-                'hits': 1,
-                'age': 0,
-                'active': False,
-                'class_id': detections[j]['class_id'],
-                'positions': [self.get_center(detections[j]['bbox'])]
-            }
-            self.next_id += 1
+            self.new_track(detections[j])
             
         # Handle unmatched tracks
         for track_id in unmatched_tracks:
-            self.tracks[track_id]['age'] += 1
+            self.miss_track(track_id)
             # Keep only last 30 positions to avoid memory growth
             self.tracks[track_id]['positions'] = self.tracks[track_id]['positions'][-30:]
+            self.tracks[track_id]['timestamps'] = self.tracks[track_id]['timestamps'][-30:]
             
         # Remove old tracks
         for track_id in list(self.tracks.keys()):
             if self.tracks[track_id]['age'] > self.max_age:
-                del self.tracks[track_id]
+                self.remove_track(track_id)
                 
         # Return active tracks
         return {k: v for k, v in self.tracks.items() if v['active']}
 
+    def get_state(self):
+        """
+        Snapshot the tracker for checkpointing
+        
+        Returns:
+            dict: JSON-serializable tracker state
+        """
+        return {
+            'tracks': {str(track_id): dict(track) for track_id, track in self.tracks.items()},
+            'next_id': self.next_id,
+            'frame_index': self.frame_index,
+            'timestamp': self.timestamp
+        }
+
+    def set_state(self, state):
+        """
+        Restore a tracker snapshot taken with get_state
+        
+        Args:
+            state (dict): Tracker state
+        """
+        self.tracks = {}
+        for track_id, track in state['tracks'].items():
+            track = dict(track)
+            track['positions'] = [tuple(p) for p in track['positions']]
+            self.tracks[int(track_id)] = track
+        self.next_id = state['next_id']
+        self.frame_index = state['frame_index']
+        self.timestamp = state['timestamp']
+
+    def flush(self):
+        """Remove every remaining track, e.g. at the end of a video"""
+        for track_id in list(self.tracks.keys()):
+            self.remove_track(track_id)
+
 # Function wrapper for backward compatibility
 def track_vehicles(frame, frame_count, prev_tracks=None):
     """